@@ -1,119 +1,372 @@
-from flask import Flask, request, render_template, flash, redirect, url_for
+import os
+
+# Configure the TensorFlow runtime before it is imported: enable oneDNN kernels
+# and size the thread pools so concurrent server processes don't oversubscribe the CPU
+INTRA_OP_THREADS = int(os.environ.get('TF_NUM_INTRAOP_THREADS', max(1, (os.cpu_count() or 1) // 2)))
+INTER_OP_THREADS = int(os.environ.get('TF_NUM_INTEROP_THREADS', 2))
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+os.environ.setdefault('OMP_NUM_THREADS', str(INTRA_OP_THREADS))
+
+from flask import Flask, Request, request, render_template, flash, redirect, url_for
 import tensorflow as tf
+from tensorflow.keras.applications.efficientnet import preprocess_input
 import numpy as np
+import cv2
 from PIL import Image
-import os
+import io
+import hashlib
+import tempfile
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    tf.config.threading.set_intra_op_parallelism_threads(INTRA_OP_THREADS)
+    tf.config.threading.set_inter_op_parallelism_threads(INTER_OP_THREADS)
+except RuntimeError as e:
+    # Thread pools can't be resized once something else initialized TensorFlow
+    print(f"Could not configure TensorFlow thread pools: {e}")
+
+class InMemoryUploadRequest(Request):
+    """Request that keeps uploaded files in memory instead of spooling them to a temp file"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        # Uploads are capped by MAX_CONTENT_LENGTH, so a plain buffer is safe
+        return io.BytesIO()
+
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 app.secret_key = 'your-secret-key-here'  # Change this in production
 
 # Configure upload settings
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+MAX_UPLOAD_SIZE = 8 * 1024 * 1024  # 8 MB
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
 
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Load the model
+# Uploaded images are written to disk in the background while the model runs
+upload_executor = ThreadPoolExecutor(max_workers=2)
+
+# When TF_SERVING_ADDR is set (e.g. localhost:8500), inference is forwarded over
+# gRPC to a TensorFlow Serving instance and no model is loaded in this process
+TF_SERVING_ADDR = os.environ.get('TF_SERVING_ADDR')
+TF_SERVING_MODEL = os.environ.get('TF_SERVING_MODEL', 'dr')
+TF_SERVING_TIMEOUT = float(os.environ.get('TF_SERVING_TIMEOUT', '10'))
+
+if TF_SERVING_ADDR:
+    try:
+        import grpc
+        from tensorflow_serving.apis import predict_pb2, prediction_service_pb2_grpc
+    except ImportError as e:
+        print(f"TensorFlow Serving client unavailable, using a local model: {e}")
+        TF_SERVING_ADDR = None
+
+# Created per process by load_backend(), gRPC channels can't be used across a fork
+serving_stub = None
+
+# The local model is built lazily in each server process by load_backend(),
+# never at import: TensorFlow and ONNX Runtime start thread pools that do not
+# survive a fork, so nothing may run in a gunicorn master before it forks.
+# Backends are tried in order: ONNX Runtime, int8 TFLite, then the SavedModel.
+ONNX_MODEL_PATH = "model.onnx"
+TFLITE_MODEL_PATH = "model_int8.tflite"
+# The quantized model trades accuracy for speed, so it is only served when
+# explicitly enabled after checking its predictions against the float model
+USE_INT8_MODEL = os.environ.get('USE_INT8_MODEL') == '1'
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models/dr/1')
+
+ort_session = None
+ort_input_name = None
+# TFLite interpreters keyed by batch size, each allocated once for its shape
+tflite_interpreters = {}
+# The loaded SavedModel must stay referenced for as long as its signature is used
 model = None
-try:
-    # Try to load the fresh model first (compatible with TensorFlow 2.19.0)
-    print("Attempting to load fresh model...")
+infer = None
+backend_pid = None
+backend_lock = threading.Lock()
+
+def load_onnx_session(model_path=ONNX_MODEL_PATH):
+    """Create an ONNX Runtime session for the exported graph, or return None"""
+    if not os.path.exists(model_path):
+        return None
+    import onnxruntime as ort
+
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.intra_op_num_threads = INTRA_OP_THREADS
+    sess_options.inter_op_num_threads = INTER_OP_THREADS
+    return ort.InferenceSession(model_path,
+                                sess_options=sess_options,
+                                providers=["CPUExecutionProvider"])
+
+def load_tflite_interpreter(batch_size=1, model_path=TFLITE_MODEL_PATH):
+    """Create a TFLite interpreter for the int8 model at a fixed batch size, or return None"""
+    if not os.path.exists(model_path):
+        return None
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=INTRA_OP_THREADS)
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    if batch_size != 1:
+        interpreter.resize_tensor_input(input_index, [batch_size, 224, 224, 3])
+    interpreter.allocate_tensors()
+    return interpreter, input_index, output_index
+
+def load_saved_model(model_dir=MODEL_DIR):
+    """Load the exported SavedModel from model_dir"""
+    # Its serving signature already contains EfficientNet preprocessing and the
+    # forward pass, traced once at export time, so nothing is retraced here
+    if not os.path.exists(os.path.join(model_dir, 'saved_model.pb')):
+        raise FileNotFoundError(
+            f"No SavedModel found in '{model_dir}'. Run: python export_model.py")
+    return tf.saved_model.load(model_dir)
+
+def load_backend():
+    """Build and warm up the inference backend once per process"""
+    global serving_stub, backend_pid
+    if backend_pid == os.getpid():
+        return
+    with backend_lock:
+        if backend_pid == os.getpid():
+            return
+        if TF_SERVING_ADDR:
+            # A remote TensorFlow Serving instance is left to warm itself up
+            serving_channel = grpc.insecure_channel(TF_SERVING_ADDR)
+            serving_stub = prediction_service_pb2_grpc.PredictionServiceStub(serving_channel)
+            print(f"✅ Forwarding predictions to TensorFlow Serving at {TF_SERVING_ADDR}!")
+        else:
+            build_local_backend()
+        backend_pid = os.getpid()
+
+def build_local_backend():
+    """Load the first available local model and warm it up"""
+    global ort_session, ort_input_name, model, infer
     try:
-        model = tf.keras.models.load_model("diabetic_model_fresh.h5")
-        print("✅ Fresh model loaded successfully!")
-    except Exception as e1:
-        print(f"Fresh model loading failed: {e1}")
-        
-        # Try to load the compatible model
-        print("Attempting to load compatible model...")
+        ort_session = load_onnx_session()
+        if ort_session is not None:
+            ort_input_name = ort_session.get_inputs()[0].name
+            print(f"✅ ONNX Runtime session created from {ONNX_MODEL_PATH}!")
+    except Exception as e:
+        print(f"ONNX Runtime unavailable, falling back to the next model: {e}")
+        ort_session = None
+
+    if ort_session is None and USE_INT8_MODEL:
         try:
-            model = tf.keras.models.load_model("diabetic_model_compatible.h5")
-            print("✅ Compatible model loaded successfully!")
-        except Exception as e2:
-            print(f"Compatible model loading failed: {e2}")
-            
-            # Fallback to original model with multiple loading approaches
-            print("Attempting to load original model...")
-            
-            # Method 1: Basic loading
-            try:
-                model = tf.keras.models.load_model("diabetic_model.h5")
-                print("✅ Original model loaded successfully with basic method!")
-            except Exception as e3:
-                print(f"Basic loading failed: {e3}")
-                
-                # Method 2: Loading with compile=False
-                try:
-                    model = tf.keras.models.load_model("diabetic_model.h5", compile=False)
-                    print("✅ Original model loaded successfully with compile=False!")
-                except Exception as e4:
-                    print(f"Compile=False loading failed: {e4}")
-                    
-                    # Method 3: Loading with custom_objects
-                    try:
-                        model = tf.keras.models.load_model("diabetic_model.h5", custom_objects={})
-                        print("✅ Original model loaded successfully with custom_objects!")
-                    except Exception as e5:
-                        print(f"Custom objects loading failed: {e5}")
-                        
-                        # Method 4: Loading with both options
-                        try:
-                            model = tf.keras.models.load_model("diabetic_model.h5", compile=False, custom_objects={})
-                            print("✅ Original model loaded successfully with both options!")
-                        except Exception as e6:
-                            print(f"All loading methods failed: {e6}")
-                            print("Creating a fresh model for demonstration...")
-                            
-                            # Create a fresh model as fallback
-                            try:
-                                from tensorflow.keras.applications import EfficientNetB0
-                                from tensorflow.keras import layers, models
-                                
-                                base_model = EfficientNetB0(include_top=False, weights='imagenet', input_shape=(224, 224, 3))
-                                base_model.trainable = False
-                                
-                                model = models.Sequential([
-                                    base_model,
-                                    layers.GlobalAveragePooling2D(),
-                                    layers.Dropout(0.3),
-                                    layers.Dense(128, activation='relu'),
-                                    layers.Dropout(0.2),
-                                    layers.Dense(5, activation='softmax')
-                                ])
-                                
-                                model.compile(optimizer='adam',
-                                              loss='sparse_categorical_crossentropy',
-                                              metrics=['accuracy'])
-                                
-                                print("✅ Fresh model created successfully!")
-                                print("⚠️  Note: This is a demonstration model with ImageNet weights.")
-                                print("   For production use, train this model on your diabetic retinopathy data.")
-                                
-                            except Exception as e7:
-                                print(f"Fresh model creation also failed: {e7}")
-                                model = None
-
-except Exception as e:
-    print(f"All model loading methods failed: {e}")
-    model = None
+            tflite_model = load_tflite_interpreter()
+            if tflite_model is not None:
+                tflite_interpreters[1] = tflite_model
+                print(f"✅ TFLite interpreter created from {TFLITE_MODEL_PATH}!")
+        except Exception as e:
+            print(f"TFLite model loading failed, falling back to the SavedModel: {e}")
+            tflite_interpreters.clear()
+
+    if ort_session is None and not tflite_interpreters:
+        try:
+            model = load_saved_model()
+            infer = model.signatures['serving_default']
+            print(f"✅ SavedModel loaded from {MODEL_DIR}!")
+        except Exception as e:
+            print(f"Model loading failed: {e}")
+            model = None
+
+    if model_loaded():
+        try:
+            warmup_model()
+        except Exception as e:
+            print(f"Model warmup failed: {e}")
+
+# Dynamic batching: concurrent uploads are collated into a single forward pass.
+# A worker never has more requests in flight than it has threads, so a larger
+# batch size could never fill and every batch would wait out the full timeout
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', os.environ.get('GUNICORN_THREADS', '4')))
+BATCH_TIMEOUT_MS = float(os.environ.get('BATCH_TIMEOUT_MS', '20'))
+# Upper bound on how long a request waits for its batch to be processed
+PREDICTION_TIMEOUT = float(os.environ.get('PREDICTION_TIMEOUT', '60'))
+
+batch_queue = queue.Queue()
+# Input buffer reused for every batch; only the batch worker thread touches it
+batch_buffer = np.empty((MAX_BATCH_SIZE, 224, 224, 3), dtype=np.uint8)
+batch_worker = None
+batch_worker_lock = threading.Lock()
+
+# LRU cache of predictions keyed by a hash of the uploaded bytes, so repeated
+# uploads of the same image skip decoding and inference entirely
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '1024'))
+
+prediction_cache = OrderedDict()
+prediction_cache_lock = threading.Lock()
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_image(image):
-    """Preprocess image for EfficientNetB0 model"""
-    image = image.resize((224, 224))  # EfficientNetB0 input size
-    img_array = np.array(image)
-    # Apply EfficientNet-specific preprocessing
-    from tensorflow.keras.applications.efficientnet import preprocess_input
-    img_array = preprocess_input(img_array)
-    img_array = np.expand_dims(img_array, axis=0)
-    return img_array
+def decode_image(raw_bytes):
+    """Decode uploaded bytes into an RGB uint8 array"""
+    # Image.open only parses the header, nothing is decoded yet
+    image = Image.open(io.BytesIO(raw_bytes))
+    if image.format == 'JPEG':
+        # Have libjpeg decode at a reduced scale (up to 1/8) that is still at
+        # least 224x224, instead of decoding the full-resolution fundus photo
+        image.draft('RGB', (224, 224))
+        return np.asarray(image.convert('RGB'))
+
+    buf = np.frombuffer(raw_bytes, np.uint8)
+    img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if img is not None:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    # OpenCV can't decode GIFs, let PIL handle those
+    return np.asarray(image.convert('RGB'))
+
+def preprocess_image(img):
+    """Resize image to the EfficientNetB0 input size"""
+    return cv2.resize(img, (224, 224), interpolation=cv2.INTER_AREA)  # EfficientNetB0 input size
+
+def model_loaded():
+    """Check whether an inference backend has been built in this process"""
+    return (any(backend is not None for backend in (serving_stub, ort_session, infer))
+            or bool(tflite_interpreters))
+
+def model_available():
+    """Load the inference backend if needed and check whether it is ready"""
+    load_backend()
+    return model_loaded()
+
+def run_inference(batch):
+    """Run the loaded model on a uint8 image batch"""
+    if serving_stub is not None:
+        # The exported serving signature applies EfficientNet preprocessing itself
+        predict_request = predict_pb2.PredictRequest()
+        predict_request.model_spec.name = TF_SERVING_MODEL
+        predict_request.model_spec.signature_name = 'serving_default'
+        predict_request.inputs['images'].CopyFrom(tf.make_tensor_proto(batch))
+        response = serving_stub.Predict(predict_request, timeout=TF_SERVING_TIMEOUT)
+        return tf.make_ndarray(response.outputs['probabilities'])
+    if infer is not None:
+        # EfficientNet preprocessing is fused into the serving signature
+        return infer(images=tf.constant(batch))['probabilities'].numpy()
+
+    if ort_session is not None:
+        # The ONNX model is converted from the serving signature, so it takes uint8 too
+        return ort_session.run(None, {ort_input_name: batch})[0]
+
+    if tflite_interpreters:
+        # One interpreter per batch size, so varying concurrency never
+        # triggers resize_tensor_input/allocate_tensors on a hot interpreter
+        tflite_model = tflite_interpreters.get(len(batch))
+        if tflite_model is None:
+            tflite_model = load_tflite_interpreter(batch_size=len(batch))
+            tflite_interpreters[len(batch)] = tflite_model
+        interpreter, input_index, output_index = tflite_model
+        # Convert straight into the interpreter's float input buffer instead of
+        # allocating a float copy of the batch and passing it to set_tensor
+        input_tensor = interpreter.tensor(input_index)()
+        np.copyto(input_tensor, batch, casting='unsafe')
+        # Apply EfficientNet-specific preprocessing (a pass-through, so no copy)
+        input_tensor[...] = preprocess_input(input_tensor)
+        # The interpreter refuses to invoke while a view of its buffers is alive
+        del input_tensor
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index)
+
+def warmup_model():
+    """Run dummy batches so kernel setup happens at startup, not on the first request"""
+    for batch_size in sorted({1, MAX_BATCH_SIZE}):
+        run_inference(np.zeros((batch_size, 224, 224, 3), dtype=np.uint8))
+    print("✅ Model warmed up!")
+
+def batch_worker_loop():
+    """Collect queued images into batches and run them through the model"""
+    while True:
+        items = [batch_queue.get()]
+        deadline = time.monotonic() + BATCH_TIMEOUT_MS / 1000
+        while len(items) < MAX_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(batch_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            for i, (processed, _) in enumerate(items):
+                np.copyto(batch_buffer[i], processed)
+            predictions = run_inference(batch_buffer[:len(items)])
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            continue
+        for i, (_, future) in enumerate(items):
+            future.set_result(predictions[i:i + 1])
+
+def predict(processed):
+    """Queue a resized image for batched inference and wait for its prediction"""
+    global batch_worker
+    if serving_stub is not None:
+        # TensorFlow Serving batches requests itself (models/batching_parameters.txt),
+        # collating them here as well would only add latency
+        return run_inference(np.expand_dims(processed, axis=0))
+    with batch_worker_lock:
+        # Started lazily so each (possibly forked) server process gets its own worker
+        if batch_worker is None or not batch_worker.is_alive():
+            batch_worker = threading.Thread(target=batch_worker_loop, daemon=True)
+            batch_worker.start()
+    future = Future()
+    batch_queue.put((processed, future))
+    return future.result(timeout=PREDICTION_TIMEOUT)
+
+def image_cache_key(raw_bytes):
+    """Hash uploaded bytes into a prediction cache key"""
+    if blake3 is not None:
+        return blake3(raw_bytes).digest(length=16)
+    return hashlib.blake2b(raw_bytes, digest_size=16).digest()
+
+def get_cached_prediction(key):
+    """Return the cached prediction for key, or None"""
+    with prediction_cache_lock:
+        prediction = prediction_cache.get(key)
+        if prediction is not None:
+            prediction_cache.move_to_end(key)
+        return prediction
+
+def cache_prediction(key, prediction):
+    """Store a prediction, evicting the least recently used entries"""
+    with prediction_cache_lock:
+        prediction_cache[key] = prediction
+        prediction_cache.move_to_end(key)
+        while len(prediction_cache) > PREDICTION_CACHE_SIZE:
+            prediction_cache.popitem(last=False)
+
+def save_upload(filepath, raw_bytes):
+    """Write the uploaded bytes to disk as-is"""
+    if os.path.exists(filepath):
+        # Upload names include a content hash, so the same bytes are already there
+        return
+    try:
+        # Write to a temporary file and rename it into place, so the image is
+        # never visible half-written
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(filepath), delete=False) as f:
+            f.write(raw_bytes)
+        # Temporary files are private to the owner, uploads are public static files
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, filepath)
+    except OSError as e:
+        print(f"Failed to save upload {filepath}: {e}")
 
 def get_prediction_label(class_idx):
     """Convert class index to human-readable label"""
@@ -147,26 +400,37 @@ def index():
             return redirect(request.url)
         
         try:
-            # Read and process the image
-            image = Image.open(file)
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            processed = preprocess_image(image)
+            # Read the upload once; the same bytes feed the cache, decoder and disk writer
+            raw_bytes = file.stream.read()
             
             # Make prediction
-            if model is not None:
-                prediction = model.predict(processed)
-                class_idx = np.argmax(prediction)
-                confidence = float(np.max(prediction))
+            if model_available():
+                cache_key = image_cache_key(raw_bytes)
+                # The content hash keeps uploads with the same name from replacing each other
+                filename = f"{cache_key.hex()}_{secure_filename(file.filename)}"
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                
+                prediction = get_cached_prediction(cache_key)
+                if prediction is None:
+                    img = decode_image(raw_bytes)
+                    # Only bytes that decoded as an image reach the public upload folder;
+                    # the write still overlaps with inference
+                    upload_saved = upload_executor.submit(save_upload, filepath, raw_bytes)
+                    processed = preprocess_image(img)
+                    prediction = predict(processed)
+                    cache_prediction(cache_key, prediction)
+                else:
+                    # Cached bytes already decoded once. Nothing overlaps with this write,
+                    # so a cache hit waits on the disk I/O below (a no-op for repeat files).
+                    upload_saved = upload_executor.submit(save_upload, filepath, raw_bytes)
+                
+                probs = prediction[0]
+                class_idx = int(probs.argmax())
+                confidence = float(probs[class_idx])
                 label = get_prediction_label(class_idx)
                 
-                # Save uploaded image
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                image.save(filepath)
+                # result.html links to the image, so it must be on disk first
+                upload_saved.result()
                 
                 return render_template("result.html", 
                                      prediction=class_idx, 
@@ -174,7 +438,7 @@ def index():
                                      confidence=confidence,
                                      image_filename=filename)
             else:
-                flash('Model not available. Please check if diabetic_model.h5 exists.')
+                flash('Model not available. Please run export_model.py to export the model.')
                 return redirect(request.url)
                 
         except Exception as e:
@@ -183,9 +447,16 @@ def index():
     
     return render_template("index.html")
 
+@app.errorhandler(RequestEntityTooLarge)
+def file_too_large(e):
+    flash(f'File too large. Please upload an image smaller than {MAX_UPLOAD_SIZE // (1024 * 1024)} MB.')
+    return redirect(url_for('index'))
+
 @app.route("/about")
 def about():
     return render_template("about.html")
 
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server only, use gunicorn (see gunicorn.conf.py) in production
+    load_backend()
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
@@ -0,0 +1,16 @@
+"""
+Shared pytest fixtures for the model tests.
+"""
+
+import os
+import pytest
+import tensorflow as tf
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diabetic_model_fresh.h5")
+
+@pytest.fixture(scope="session")
+def model():
+    """Load the model once per test session and share it between tests."""
+    if not os.path.exists(MODEL_PATH):
+        pytest.skip(f"{MODEL_PATH} not found. Run create_fresh_model.py first.")
+    return tf.keras.models.load_model(MODEL_PATH, compile=False)
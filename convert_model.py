@@ -6,7 +6,9 @@ Convert model to compatible format for current TensorFlow version.
 import tensorflow as tf
 import numpy as np
 from tensorflow.keras.applications import EfficientNetB0
+from tensorflow.keras.applications.efficientnet import preprocess_input
 from tensorflow.keras import layers, models
+from export_model import export_all
 
 def create_compatible_model():
     """Create a new model with the same architecture that's compatible with current TensorFlow."""
@@ -46,29 +48,34 @@ def convert_model():
         # Create a new compatible model
         compatible_model = create_compatible_model()
         
-        # Copy weights from original to compatible model
+        # Copy weights from original to compatible model. The architectures are
+        # identical, so variables can be assigned directly without the numpy
+        # round-trip of get_weights/set_weights
         print("Copying weights...")
-        for original_layer, compatible_layer in zip(original_model.layers, compatible_model.layers):
-            if hasattr(original_layer, 'get_weights') and hasattr(compatible_layer, 'set_weights'):
-                try:
-                    weights = original_layer.get_weights()
-                    compatible_layer.set_weights(weights)
-                    print(f"✅ Copied weights for layer: {original_layer.name}")
-                except Exception as e:
-                    print(f"⚠️  Could not copy weights for layer {original_layer.name}: {e}")
+        original_variables = original_model.variables
+        compatible_variables = compatible_model.variables
+        if len(original_variables) != len(compatible_variables):
+            raise ValueError(f"Expected {len(compatible_variables)} variables, "
+                             f"found {len(original_variables)} in the original model")
+        for original_variable, compatible_variable in zip(original_variables, compatible_variables):
+            compatible_variable.assign(original_variable)
+        print(f"✅ Copied {len(compatible_variables)} weight variables")
         
         # Save the compatible model
         compatible_model.save("diabetic_model_compatible.h5")
         print("✅ Compatible model saved as 'diabetic_model_compatible.h5'")
         
+        if not export_all(compatible_model):
+            print("⚠️  Model export failed. Run 'python export_model.py "
+                  "diabetic_model_compatible.h5' to retry the export.")
+        
         # Test the compatible model
         print("Testing compatible model...")
         test_image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
-        from tensorflow.keras.applications.efficientnet import preprocess_input
         test_image = preprocess_input(test_image)
         test_image = np.expand_dims(test_image, axis=0)
         
-        prediction = compatible_model.predict(test_image)
+        prediction = compatible_model(test_image, training=False).numpy()
         class_idx = np.argmax(prediction)
         confidence = float(np.max(prediction))
         
@@ -97,7 +104,7 @@ if __name__ == "__main__":
     
     if success:
         print("\n🎉 Model conversion completed successfully!")
-        print("You can now use 'diabetic_model_compatible.h5' in your Flask app.")
+        print("Restart the Flask app to serve the converted model.")
     else:
         print("\n⚠️  Model conversion completed with fallback.")
         print("The new model needs to be retrained with your data.")
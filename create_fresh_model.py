@@ -6,7 +6,9 @@ Create a fresh model compatible with current TensorFlow version.
 import tensorflow as tf
 import numpy as np
 from tensorflow.keras.applications import EfficientNetB0
+from tensorflow.keras.applications.efficientnet import preprocess_input
 from tensorflow.keras import layers, models
+from export_model import export_all
 
 def create_fresh_model():
     """Create a fresh model that's guaranteed to work with current TensorFlow."""
@@ -42,12 +44,11 @@ def test_model(model):
         test_image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
         
         # Preprocess for EfficientNet
-        from tensorflow.keras.applications.efficientnet import preprocess_input
         test_image = preprocess_input(test_image)
         test_image = np.expand_dims(test_image, axis=0)
         
         # Make prediction
-        prediction = model.predict(test_image)
+        prediction = model(test_image, training=False).numpy()
         class_idx = np.argmax(prediction)
         confidence = float(np.max(prediction))
         
@@ -78,6 +79,9 @@ def main():
         model.save("diabetic_model_fresh.h5")
         print("✅ Fresh model saved as 'diabetic_model_fresh.h5'")
         
+        if not export_all(model):
+            print("⚠️  Model export failed. Run 'python export_model.py' to retry the export.")
+        
         print("\n🎉 Fresh model creation completed successfully!")
         print("This model will work with your current TensorFlow version.")
         print("Note: This model has ImageNet weights but needs to be trained on your data.")
@@ -92,8 +96,8 @@ if __name__ == "__main__":
     
     if success:
         print("\n📝 Next Steps:")
-        print("1. Use 'diabetic_model_fresh.h5' in your Flask app")
+        print("1. Restart the Flask app to serve this model")
         print("2. Train the model on your diabetic retinopathy dataset")
-        print("3. Replace the model file once trained")
+        print("3. Export the trained model with: python export_model.py diabetic_model.h5")
     else:
         print("\n⚠️  Please check your TensorFlow installation.")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Export the trained Keras model to optimized inference formats used by app.py.
+"""
+
+import os
+import sys
+import glob
+import shutil
+import numpy as np
+import cv2
+import tensorflow as tf
+from tensorflow.keras.applications.efficientnet import preprocess_input
+from PIL import Image
+
+KERAS_MODEL_PATH = "diabetic_model_fresh.h5"
+ONNX_MODEL_PATH = "model.onnx"
+TFLITE_MODEL_PATH = "model_int8.tflite"
+# TensorFlow Serving expects <model_base_path>/<version>/
+SAVED_MODEL_DIR = "models/dr/1"
+# Representative retinal images used to calibrate int8 quantization ranges
+CALIBRATION_FOLDER = "calibration_images"
+CALIBRATION_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif"}
+MAX_CALIBRATION_SAMPLES = 100
+
+def load_keras_model(path=KERAS_MODEL_PATH):
+    """Load the Keras model that should be exported."""
+    print(f"Loading Keras model from {path}...")
+    model = tf.keras.models.load_model(path, compile=False)
+    print("✅ Keras model loaded!")
+    return model
+
+def export_onnx(model, output_path=ONNX_MODEL_PATH):
+    """Convert the serving signature to ONNX so it can be served with ONNX Runtime."""
+    import tf2onnx
+
+    print(f"🔄 Exporting ONNX model to {output_path}...")
+
+    # from_keras does not support Keras 3, so convert the traced serving function.
+    # The ONNX model takes the same uint8 "images" input as the SavedModel.
+    serve = serving_function(model)
+    tf2onnx.convert.from_function(serve,
+                                  input_signature=serve.input_signature,
+                                  opset=15,
+                                  output_path=output_path)
+
+    print(f"✅ ONNX model saved as '{output_path}'")
+    return output_path
+
+def calibration_image_paths(folder=CALIBRATION_FOLDER):
+    """List the image files available for int8 calibration."""
+    paths = sorted(path for path in glob.glob(os.path.join(folder, "*"))
+                   if os.path.splitext(path)[1].lower() in CALIBRATION_EXTENSIONS)
+    if not paths:
+        raise FileNotFoundError(
+            f"No calibration images found in '{folder}'. Add representative "
+            f"retinal images there before exporting the int8 model.")
+    return paths[:MAX_CALIBRATION_SAMPLES]
+
+def representative_dataset():
+    """Yield preprocessed calibration images for int8 quantization."""
+    for path in calibration_image_paths():
+        # Resize the same way app.py does so calibration sees the served inputs
+        img_array = np.asarray(Image.open(path).convert("RGB"))
+        img_array = cv2.resize(img_array, (224, 224), interpolation=cv2.INTER_AREA)
+        img_array = preprocess_input(img_array.astype(np.float32))
+        yield [np.expand_dims(img_array, axis=0)]
+
+def export_tflite(model, output_path=TFLITE_MODEL_PATH):
+    """Quantize the model to int8 with post-training quantization."""
+    print(f"🔄 Exporting int8 TFLite model to {output_path}...")
+
+    # Fail early instead of calibrating on nothing
+    calibration_image_paths()
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # Input and output stay float32 so app.py can feed the same preprocessed arrays
+    tflite_model = converter.convert()
+
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+
+    print(f"✅ TFLite model saved as '{output_path}'")
+    return output_path
+
+def serving_function(model):
+    """Wrap the model in a tf.function that takes uint8 images and preprocesses them."""
+    # Clients send resized uint8 images; the float conversion happens in the graph.
+    # The batch dimension stays dynamic so several images can share a run.
+    @tf.function(input_signature=[tf.TensorSpec([None, 224, 224, 3], tf.uint8, name="images")])
+    def serve(images):
+        x = preprocess_input(tf.cast(images, tf.float32))
+        return {"probabilities": model(x, training=False)}
+
+    return serve
+
+def export_saved_model(model, export_dir=SAVED_MODEL_DIR):
+    """Export a SavedModel for TensorFlow Serving with preprocessing built in."""
+    print(f"🔄 Exporting SavedModel to {export_dir}...")
+
+    tf.saved_model.save(model, export_dir,
+                        signatures={"serving_default": serving_function(model)})
+
+    print(f"✅ SavedModel saved to '{export_dir}'")
+    return export_dir
+
+def remove_export(path):
+    """Delete an earlier export so app.py can't keep serving a stale model."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def export_all(model):
+    """Export the model to every format app.py can serve."""
+    success = False
+
+    # app.py serves whichever export it finds first, so an export that fails
+    # must not leave an older model behind in its place
+    for output_path in (SAVED_MODEL_DIR, ONNX_MODEL_PATH, TFLITE_MODEL_PATH):
+        remove_export(output_path)
+
+    try:
+        export_saved_model(model)
+        success = True
+    except Exception as e:
+        print(f"❌ SavedModel export failed: {e}")
+
+    try:
+        export_onnx(model)
+        success = True
+    except ImportError:
+        print("❌ tf2onnx is not installed. Run: pip install tf2onnx")
+    except Exception as e:
+        print(f"❌ ONNX export failed: {e}")
+
+    try:
+        export_tflite(model)
+        success = True
+    except Exception as e:
+        print(f"❌ TFLite export failed: {e}")
+
+    return success
+
+def main():
+    """Export the model to every supported format."""
+    print("🔄 Model Export Tool")
+    print("=" * 30)
+
+    keras_model_path = sys.argv[1] if len(sys.argv) > 1 else KERAS_MODEL_PATH
+    if not os.path.exists(keras_model_path):
+        print(f"❌ {keras_model_path} not found. Run create_fresh_model.py first.")
+        return False
+
+    model = load_keras_model(keras_model_path)
+    return export_all(model)
+
+if __name__ == "__main__":
+    success = main()
+
+    if success:
+        print("\n🎉 Model export completed successfully!")
+        print("Restart the Flask app to serve the exported model.")
+    else:
+        print("\n⚠️  Model export failed. The Flask app needs at least one exported model.")
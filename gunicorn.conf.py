@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration for serving the Diabetic Retinopathy Detection app.
+
+Run with: gunicorn app:app
+"""
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# Each worker imports app.py and builds its own model. TensorFlow and ONNX
+# Runtime are not fork-safe, so the model must never be created in the master
+# and inherited by forked workers
+preload_app = False
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+# Concurrent requests per worker; these are what the batching queue collates,
+# so app.py defaults MAX_BATCH_SIZE to the same value
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Large uploads on a loaded CPU can take a while to analyze
+timeout = 120
+
+def post_worker_init(worker):
+    """Load and warm up the model before the worker accepts requests."""
+    from app import load_backend
+
+    load_backend()
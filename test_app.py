@@ -7,6 +7,7 @@ This script tests the application startup without requiring a model file.
 import os
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import numpy as np
 
@@ -83,6 +84,72 @@ def test_file_upload():
         print(f"❌ File upload test failed: {e}")
         return False
 
+def test_prediction_cache():
+    """Test the LRU cache of predictions keyed by image content."""
+    import app as app_module
+    
+    original_size = app_module.PREDICTION_CACHE_SIZE
+    app_module.PREDICTION_CACHE_SIZE = 2
+    app_module.prediction_cache.clear()
+    try:
+        keys = [app_module.image_cache_key(data) for data in (b'first', b'second', b'third')]
+        assert keys[0] == app_module.image_cache_key(b'first'), "Cache keys are not stable per image content"
+        assert len(set(keys)) == 3, "Different images share a cache key"
+        
+        app_module.cache_prediction(keys[0], np.array([[1.0, 0, 0, 0, 0]]))
+        app_module.cache_prediction(keys[1], np.array([[0, 1.0, 0, 0, 0]]))
+        # Touch the first entry so the second one becomes least recently used
+        app_module.get_cached_prediction(keys[0])
+        app_module.cache_prediction(keys[2], np.array([[0, 0, 1.0, 0, 0]]))
+        
+        assert app_module.get_cached_prediction(keys[1]) is None, "Least recently used prediction was not evicted"
+        assert app_module.get_cached_prediction(keys[0]) is not None, "Recently used prediction was evicted"
+    finally:
+        app_module.PREDICTION_CACHE_SIZE = original_size
+        app_module.prediction_cache.clear()
+    
+    print("✅ Prediction cache test passed!")
+
+def test_prediction_batching():
+    """Test that concurrent predictions are collated into capped batches."""
+    import app as app_module
+    
+    calls = []
+    
+    def fake_run_inference(batch):
+        calls.append(len(batch))
+        # One row per image, holding the value the image was filled with
+        return batch[:, 0, 0, :1].astype(np.float32)
+    
+    def failing_run_inference(batch):
+        raise RuntimeError("backend unavailable")
+    
+    original = (app_module.run_inference, app_module.serving_stub, app_module.BATCH_TIMEOUT_MS)
+    # A long collation window keeps the test independent of thread start-up timing
+    app_module.serving_stub = None
+    app_module.BATCH_TIMEOUT_MS = 1000
+    try:
+        app_module.run_inference = fake_run_inference
+        count = app_module.MAX_BATCH_SIZE + 1
+        images = [np.full((224, 224, 3), i + 1, dtype=np.uint8) for i in range(count)]
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            results = list(executor.map(app_module.predict, images))
+        
+        assert calls == [app_module.MAX_BATCH_SIZE, 1], f"Unexpected batch sizes {calls}"
+        for i, result in enumerate(results):
+            assert result.shape == (1, 1), f"Unexpected prediction shape {result.shape}"
+            assert result[0, 0] == i + 1, "A caller received another image's prediction"
+        
+        app_module.run_inference = failing_run_inference
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(app_module.predict, image) for image in images[:2]]
+        for future in futures:
+            assert isinstance(future.exception(), RuntimeError), "Backend error did not reach a caller"
+    finally:
+        app_module.run_inference, app_module.serving_stub, app_module.BATCH_TIMEOUT_MS = original
+    
+    print("✅ Prediction batching test passed!")
+
 def main():
     """Run all tests."""
     print("🧪 Testing Diabetic Retinopathy Detection Application")
@@ -96,18 +163,39 @@ def main():
     print("\n2. Testing file upload validation...")
     upload_ok = test_file_upload()
     
+    # Test 3: Prediction cache
+    print("\n3. Testing prediction cache...")
+    try:
+        test_prediction_cache()
+        cache_ok = True
+    except Exception as e:
+        print(f"❌ Prediction cache test failed: {e}")
+        cache_ok = False
+    
+    # Test 4: Prediction batching
+    print("\n4. Testing prediction batching...")
+    try:
+        test_prediction_batching()
+        batching_ok = True
+    except Exception as e:
+        print(f"❌ Prediction batching test failed: {e}")
+        batching_ok = False
+    
     # Summary
     print("\n" + "=" * 50)
     print("📊 Test Summary:")
     print(f"   Application Startup: {'✅ PASS' if startup_ok else '❌ FAIL'}")
     print(f"   File Upload Validation: {'✅ PASS' if upload_ok else '❌ FAIL'}")
+    print(f"   Prediction Cache: {'✅ PASS' if cache_ok else '❌ FAIL'}")
+    print(f"   Prediction Batching: {'✅ PASS' if batching_ok else '❌ FAIL'}")
     
-    if startup_ok and upload_ok:
+    if startup_ok and upload_ok and cache_ok and batching_ok:
         print("\n🎉 All tests passed! The application is ready to run.")
         print("\nTo start the application:")
         print("1. Add your diabetic_model.h5 file to the project directory")
-        print("2. Run: python app.py")
-        print("3. Open: http://localhost:5000")
+        print("2. Run: python export_model.py diabetic_model.h5")
+        print("3. Run: python app.py")
+        print("4. Open: http://localhost:5000")
     else:
         print("\n⚠️  Some tests failed. Please check the errors above.")
         sys.exit(1)
@@ -3,49 +3,81 @@
 Test Flask app model loading specifically.
 """
 
+import tempfile
+from pathlib import Path
 import tensorflow as tf
+from tensorflow.keras.applications.efficientnet import preprocess_input
 import numpy as np
 from PIL import Image
+from export_model import export_saved_model
 
-def test_flask_model_loading():
-    """Test the exact model loading code used in Flask app."""
-    print("🧪 Testing Flask App Model Loading")
-    print("=" * 40)
-    
-    # Test the exact loading code from Flask app
+def load_flask_model():
+    """Load the model the same way the Flask app used to."""
     try:
         # Try loading with custom_objects to handle version compatibility
         model = tf.keras.models.load_model("diabetic_model.h5", compile=False)
         print("✅ Flask app model loading successful!")
-        
-        # Test prediction like in Flask app
-        test_image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
-        from tensorflow.keras.applications.efficientnet import preprocess_input
-        test_image = preprocess_input(test_image)
-        test_image = np.expand_dims(test_image, axis=0)
-        
-        prediction = model.predict(test_image)
-        class_idx = np.argmax(prediction)
-        confidence = float(np.max(prediction))
-        
-        print(f"✅ Flask app prediction successful!")
-        print(f"   Class: {class_idx}, Confidence: {confidence:.4f}")
-        
-        return True
-        
+        return model
     except Exception as e:
         print(f"❌ Flask app model loading failed: {e}")
         try:
             # Try alternative loading method
             model = tf.keras.models.load_model("diabetic_model.h5", custom_objects={})
             print("✅ Flask app alternative loading successful!")
-            return True
+            return model
         except Exception as e2:
             print(f"❌ Flask app alternative loading also failed: {e2}")
-            return False
+            return None
+
+def test_flask_model_prediction(model):
+    """Test a prediction of the Keras model on preprocessed float input."""
+    print("🧪 Testing Flask App Model Prediction")
+    print("=" * 40)
+    
+    # Test prediction like in Flask app
+    test_image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
+    test_image = preprocess_input(test_image)
+    test_image = np.expand_dims(test_image, axis=0)
+    
+    prediction = model(test_image, training=False).numpy()
+    assert prediction.shape == (1, 5), f"Unexpected output shape {prediction.shape}"
+    assert np.isclose(prediction.sum(), 1.0, atol=1e-3), "Probabilities do not sum to 1"
+    
+    class_idx = np.argmax(prediction)
+    confidence = float(np.max(prediction))
+    
+    print(f"✅ Flask app prediction successful!")
+    print(f"   Class: {class_idx}, Confidence: {confidence:.4f}")
+
+def test_saved_model_signature(model, tmp_path):
+    """Test that the exported serving signature matches the Keras model."""
+    print("🧪 Testing Exported Serving Signature")
+    print("=" * 40)
+    
+    export_dir = export_saved_model(model, str(tmp_path / "1"))
+    serve = tf.saved_model.load(export_dir).signatures['serving_default']
+    
+    # The Flask app sends resized uint8 images and lets the signature preprocess them
+    images = np.random.randint(0, 255, (2, 224, 224, 3), dtype=np.uint8)
+    served = serve(images=tf.constant(images))['probabilities'].numpy()
+    expected = model(preprocess_input(images.astype(np.float32)), training=False).numpy()
+    
+    assert served.shape == (2, 5), f"Unexpected output shape {served.shape}"
+    np.testing.assert_allclose(served, expected, atol=1e-5)
+    
+    print("✅ Serving signature matches the Keras model!")
 
 if __name__ == "__main__":
-    success = test_flask_model_loading()
+    model = load_flask_model()
+    success = False
+    if model is not None:
+        try:
+            test_flask_model_prediction(model)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                test_saved_model_signature(model, Path(tmp_dir))
+            success = True
+        except Exception as e:
+            print(f"❌ Flask app prediction failed: {e}")
     if success:
         print("\n🎉 Flask app model loading is working!")
     else:
@@ -4,6 +4,7 @@ Test script to check model loading compatibility.
 """
 
 import tensorflow as tf
+from tensorflow.keras.applications.efficientnet import preprocess_input
 import numpy as np
 from PIL import Image
 
@@ -53,37 +54,30 @@ def test_model_loading():
 
 def test_model_prediction(model):
     """Test if the loaded model can make predictions."""
-    if model is None:
-        print("❌ No model to test!")
-        return False
+    assert model is not None, "No model to test!"
     
     print("\n🧪 Testing Model Prediction")
     print("=" * 30)
     
-    try:
-        # Create a test image
-        test_image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
-        
-        # Preprocess for EfficientNet
-        from tensorflow.keras.applications.efficientnet import preprocess_input
-        test_image = preprocess_input(test_image)
-        test_image = np.expand_dims(test_image, axis=0)
-        
-        # Make prediction
-        prediction = model.predict(test_image)
-        class_idx = np.argmax(prediction)
-        confidence = float(np.max(prediction))
-        
-        print(f"✅ Prediction successful!")
-        print(f"   Predicted class: {class_idx}")
-        print(f"   Confidence: {confidence:.4f}")
-        print(f"   Output shape: {prediction.shape}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Prediction failed: {e}")
-        return False
+    # Create a test image
+    test_image = np.random.randint(0, 255, (224, 224, 3), dtype=np.uint8)
+    
+    # Preprocess for EfficientNet
+    test_image = preprocess_input(test_image)
+    test_image = np.expand_dims(test_image, axis=0)
+    
+    # Make prediction
+    prediction = model(test_image, training=False).numpy()
+    assert prediction.shape == (1, 5), f"Unexpected output shape {prediction.shape}"
+    assert np.isclose(prediction.sum(), 1.0, atol=1e-3), "Probabilities do not sum to 1"
+    
+    class_idx = np.argmax(prediction)
+    confidence = float(np.max(prediction))
+    
+    print(f"✅ Prediction successful!")
+    print(f"   Predicted class: {class_idx}")
+    print(f"   Confidence: {confidence:.4f}")
+    print(f"   Output shape: {prediction.shape}")
 
 def main():
     """Run all tests."""
@@ -92,7 +86,12 @@ def main():
     
     if model is not None:
         # Test prediction
-        prediction_ok = test_model_prediction(model)
+        try:
+            test_model_prediction(model)
+            prediction_ok = True
+        except Exception as e:
+            print(f"❌ Prediction failed: {e}")
+            prediction_ok = False
         
         print("\n" + "=" * 50)
         print("📊 Test Summary:")